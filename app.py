@@ -1,91 +1,55 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g
 from flask_cors import CORS
-import cv2
 import numpy as np
 import base64
 import io
 import os
-import uuid
 from datetime import datetime
 
 # Import our modules
-from scripts.inference import inference, get_disease_info
-from scripts.chat import chatbot, class_info_dict, openrouter_client
+from scripts.chat import chatbot
 from scripts.database import db  # ✅ Supabase only
-from scripts.location_service import get_user_ip, get_location_from_ip, validate_coordinates
+from scripts.image_store import image_store
+from scripts.prescreen import prescreen
+from scripts.services import (
+    detect_disease,
+    get_chat_context,
+    rejection_response,
+    resolve_location,
+    save_uploaded_image,
+)
+from scripts.warmup import readiness
+from scripts.resilience import breaker_states, clear_deadline, set_deadline
+from scripts.location_service import get_user_ip
 from scripts.analytics import export_analytics_data, get_disease_heatmap_data, get_top_diseases_by_location
 
 app = Flask(__name__)
 CORS(app)
 
-# Global variables to store current detection session
-current_detection = {
-    'labels': [],
-    'classes': {},
-    'detection_id': None,
-    'location_data': None
-}
+@app.before_request
+def start_request_deadline():
+    """Give every request one time budget shared by all its external calls"""
+    g.deadline_token = set_deadline()
 
-def save_uploaded_image(image_data):
-    """Save uploaded image to disk and return the path"""
-    if not os.path.exists('uploads'):
-        os.makedirs('uploads')
-    filename = f"{uuid.uuid4()}.jpg"
-    filepath = os.path.join('uploads', filename)
-    cv2.imwrite(filepath, image_data)
-    return filepath
+@app.teardown_request
+def end_request_deadline(exc):
+    token = g.pop('deadline_token', None)
+    if token is not None:
+        clear_deadline(token)
 
 def get_location_data(request):
     """Get location data from request (coordinates or IP-based)"""
-    location_data = None
     data = request.get_json(silent=True) or {}
 
     lat = request.form.get('latitude') or data.get('latitude')
     lon = request.form.get('longitude') or data.get('longitude')
-
-    if lat and lon:
-        is_valid, lat, lon = validate_coordinates(lat, lon)
-        if is_valid:
-            location_data = {'latitude': lat, 'longitude': lon, 'source': 'coordinates'}
-
-    if not location_data:
-        user_ip = get_user_ip(request)
-        if user_ip and user_ip not in ['127.0.0.1', 'localhost']:
-            ip_location = get_location_from_ip(user_ip)
-            if ip_location:
-                location_data = {
-                    'latitude': ip_location['latitude'],
-                    'longitude': ip_location['longitude'],
-                    'location_name': ip_location['location_name'],
-                    'source': 'ip'
-                }
-    return location_data
-
-def detect_disease(image):
-    """Run disease detection on the image"""
-    try:
-        inference_image, classes, namesInfer = inference(image)
-        disease_info = get_disease_info(classes, namesInfer)
-
-        # ✅ Ensure labels are extracted safely from namesInfer
-        if isinstance(namesInfer, list) and all(isinstance(item, dict) for item in namesInfer):
-            labels = list({item["class_id"] for item in namesInfer})
-        else:
-            labels = list(set(namesInfer))
-
-        label = ", ".join([str(classes.get(label_id, "Unknown")) for label_id in labels])
-
-        global current_detection
-        current_detection['labels'] = labels
-        current_detection['classes'] = classes
-        return inference_image, label, disease_info
-    except Exception as e:
-        print(f"Error in disease detection: {e}")
-        return image, "Detection failed", []
+    return resolve_location(lat, lon, get_user_ip(request))
 
 @app.route('/upload', methods=['POST'])
 def upload():
     """Handle image upload and disease detection"""
+    import cv2
+
     try:
         if 'file' not in request.files:
             return jsonify({'error': 'No file part'}), 400
@@ -98,8 +62,14 @@ def upload():
         data = np.frombuffer(in_memory_file.getvalue(), dtype=np.uint8)
         img = cv2.imdecode(data, 1)
 
+        # Reject selfies, blank frames and blurred shots before spending model time on them
+        screen = prescreen(img)
+        if not screen.ok:
+            if screen.reason == 'unreadable':
+                return jsonify({'error': screen.message, 'reason': screen.reason}), 400
+            return jsonify(rejection_response(screen))
+
         location_data = get_location_data(request)
-        current_detection['location_data'] = location_data
 
         detected_image, label, disease_info = detect_disease(img)
         image_path = save_uploaded_image(detected_image)
@@ -113,8 +83,6 @@ def upload():
             location_name=location_data.get('location_name') if location_data else None,
             user_ip=get_user_ip(request)
         )
-        current_detection['detection_id'] = detection_id
-
         _, img_encoded = cv2.imencode('.jpg', detected_image)
         image_as_text = base64.b64encode(img_encoded).decode('utf-8')
 
@@ -123,7 +91,9 @@ def upload():
             'label': label,
             'disease_info': disease_info,
             'detection_id': detection_id,
-            'location': location_data
+            'location': location_data,
+            'image_path': image_path,
+            'thumbnail_path': image_store.thumbnail_key(image_path),
         })
     except Exception as e:
         print(f"Error in upload endpoint: {e}")
@@ -140,28 +110,18 @@ def chat():
         user_message = data['message']
         chat_history = data.get('chatHistory', [])
 
-        info = ""
-        if current_detection['labels'] and current_detection['classes']:
-            for i, label_id in enumerate(current_detection['labels']):
-                name = str(current_detection['classes'].get(label_id, "Unknown"))
-                info_current = str(class_info_dict.get(name, "No information available"))
-                info += f"{name}: {info_current}"
-                if i < len(current_detection['labels']) - 1:
-                    info += ", "
-        else:
-            info = "No disease information available. Please upload an image first."
-
+        detection_id, info = get_chat_context(data)
         bot_response = chatbot(info, chat_history, user_message)
 
         # ✅ Save chat log in Supabase
-        if current_detection['detection_id']:
+        if detection_id:
             db.save_chat_log(
-                detection_id=current_detection['detection_id'],
+                detection_id=detection_id,
                 user_message=user_message,
                 bot_response=bot_response
             )
 
-        return jsonify({'response': bot_response, 'detection_id': current_detection['detection_id']})
+        return jsonify({'response': bot_response, 'detection_id': detection_id})
     except Exception as e:
         print(f"Error in chat endpoint: {e}")
         return jsonify({'error': 'Failed to process chat request'}), 500
@@ -209,8 +169,16 @@ def recent_detections():
 
 @app.route('/health', methods=['GET'])
 def health():
-    """Health check endpoint"""
-    return jsonify({'status': 'healthy', 'timestamp': datetime.now().isoformat(), 'version': '1.0.0'})
+    """Liveness check; answers as soon as the process is up, whether or not warm-up has finished"""
+    return jsonify({'status': 'healthy', 'timestamp': datetime.now().isoformat(), 'version': '1.0.0',
+                    'ready': readiness.ready})
+
+@app.route('/health/ready', methods=['GET'])
+def health_ready():
+    """Readiness check; 503 until the model and OpenCV have been loaded"""
+    status = readiness.status()
+    status['dependencies'] = breaker_states()
+    return jsonify(status), 200 if status['ready'] else 503
 
 if __name__ == '__main__':
     if not os.path.exists('uploads'):
@@ -232,6 +200,13 @@ if __name__ == '__main__':
     print("  GET /heatmap - Get disease heatmap data")
     print("  GET /disease-by-location - Get disease distribution by location")
     print("  GET /recent-detections - Get recent detections")
-    print("  GET /health - Health check")
+    print("  GET /health - Liveness check")
+    print("  GET /health/ready - Readiness check (503 while warming up)")
+
+    print("Note: this is the Flask dev server; production runs asgi:app under gunicorn (see start.sh)")
+
+    # Heavy dependencies (cv2, ultralytics/torch, supabase) load on a background thread or
+    # on first use; importing this module starts nothing.
+    readiness.start()
 
-    app.run(debug=False, host='0.0.0.0', port=port)  # Set debug=False for production
+    app.run(debug=False, host='0.0.0.0', port=port)
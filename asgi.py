@@ -0,0 +1,263 @@
+"""
+ASGI version of the Flask routes in app.py (same endpoints and payloads).
+
+/upload pre-screens the image, then overlaps its I/O with inference: location
+lookup runs while the model is busy, and image storage, Supabase insert and JPEG encoding run together
+afterwards. CPU-bound work (decode, inference, encode) goes to a dedicated
+executor so the event loop stays free for other in-flight requests.
+
+Run with: gunicorn asgi:app -k uvicorn_worker.UvicornWorker
+"""
+from __future__ import annotations
+
+import asyncio
+import base64
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+import numpy as np
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from scripts.chat import chatbot
+from scripts.database import db
+from scripts.image_store import image_store
+from scripts.location_service import get_user_ip
+from scripts.prescreen import prescreen
+from scripts.services import (
+    detect_disease,
+    get_chat_context,
+    rejection_response,
+    resolve_location,
+    save_uploaded_image,
+)
+from scripts.warmup import readiness
+from scripts.resilience import breaker_states, deadline_scope
+from scripts.analytics import export_analytics_data, get_disease_heatmap_data, get_top_diseases_by_location
+
+# Decode, pre-screen and encode run here alongside inference. Inference itself is serialised
+# on the process's single model, and torch's intra-op pool is sized to this worker's share
+# of the cores (see scripts/inference.py), so extra threads here don't multiply model copies.
+CPU_WORKERS = int(os.environ.get("INFERENCE_WORKERS", 2))
+cpu_executor = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="inference")
+
+
+async def run_cpu(func, *args):
+    """Run CPU-bound work on the inference executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(cpu_executor, func, *args)
+
+
+def decode_image(raw: bytes):
+    import cv2
+
+    return cv2.imdecode(np.frombuffer(raw, dtype=np.uint8), 1)
+
+
+def encode_image_b64(image) -> str:
+    import cv2
+
+    _, img_encoded = cv2.imencode('.jpg', image)
+    return base64.b64encode(img_encoded).decode('utf-8')
+
+
+async def upload(request: Request):
+    """Handle image upload and disease detection"""
+    try:
+        form = await request.form()
+        file = form.get('file')
+        if file is None or isinstance(file, str):
+            return JSONResponse({'error': 'No file part'}, status_code=400)
+        if file.filename == '':
+            return JSONResponse({'error': 'No selected file'}, status_code=400)
+
+        raw = await file.read()
+        img = await run_cpu(decode_image, raw)
+
+        # Pre-screening takes milliseconds, so rejects skip the location lookup too
+        screen = await run_cpu(prescreen, img)
+        if not screen.ok:
+            if screen.reason == 'unreadable':
+                return JSONResponse({'error': screen.message, 'reason': screen.reason}, status_code=400)
+            return JSONResponse(rejection_response(screen))
+
+        user_ip = get_user_ip(request)
+        location_task = asyncio.create_task(
+            asyncio.to_thread(resolve_location, form.get('latitude'), form.get('longitude'), user_ip)
+        )
+
+        detected_image, label, disease_info = await run_cpu(detect_disease, img)
+
+        location_data = await location_task
+
+        async def persist():
+            # The image store only hashes here and writes in the background, so the
+            # DB insert starts as soon as the content key is known.
+            image_path = await run_cpu(save_uploaded_image, detected_image)
+            detection_id = await asyncio.to_thread(
+                db.save_detection,
+                image_path=image_path,
+                detected_diseases=label,
+                latitude=location_data['latitude'] if location_data else None,
+                longitude=location_data['longitude'] if location_data else None,
+                location_name=location_data.get('location_name') if location_data else None,
+                user_ip=user_ip,
+            )
+            return image_path, detection_id
+
+        (image_path, detection_id), image_as_text = await asyncio.gather(
+            persist(),
+            run_cpu(encode_image_b64, detected_image),
+        )
+        return JSONResponse({
+            'image': image_as_text,
+            'label': label,
+            'disease_info': disease_info,
+            'detection_id': detection_id,
+            'location': location_data,
+            'image_path': image_path,
+            'thumbnail_path': image_store.thumbnail_key(image_path),
+        })
+    except Exception as e:
+        print(f"Error in upload endpoint: {e}")
+        return JSONResponse({'error': 'Failed to process the image'}, status_code=500)
+
+
+async def chat(request: Request):
+    """Handle chat requests"""
+    try:
+        try:
+            data = await request.json()
+        except ValueError:
+            data = None
+        if not data or 'message' not in data:
+            return JSONResponse({'error': 'No message provided'}, status_code=400)
+
+        user_message = data['message']
+        chat_history = data.get('chatHistory', [])
+
+        detection_id, info = await asyncio.to_thread(get_chat_context, data)
+        bot_response = await asyncio.to_thread(chatbot, info, chat_history, user_message)
+
+        if detection_id:
+            await asyncio.to_thread(
+                db.save_chat_log,
+                detection_id=detection_id,
+                user_message=user_message,
+                bot_response=bot_response
+            )
+
+        return JSONResponse({'response': bot_response, 'detection_id': detection_id})
+    except Exception as e:
+        print(f"Error in chat endpoint: {e}")
+        return JSONResponse({'error': 'Failed to process chat request'}, status_code=500)
+
+
+async def analytics(request: Request):
+    """Get comprehensive analytics data"""
+    try:
+        analytics_data = await asyncio.to_thread(export_analytics_data)
+        return JSONResponse(analytics_data)
+    except Exception as e:
+        print(f"Error in analytics endpoint: {e}")
+        return JSONResponse({'error': 'Failed to get analytics data'}, status_code=500)
+
+
+async def heatmap(request: Request):
+    """Get heatmap data for disease distribution"""
+    try:
+        heatmap_data = await asyncio.to_thread(get_disease_heatmap_data)
+        return JSONResponse({'heatmap_data': heatmap_data})
+    except Exception as e:
+        print(f"Error in heatmap endpoint: {e}")
+        return JSONResponse({'error': 'Failed to get heatmap data'}, status_code=500)
+
+
+async def disease_by_location(request: Request):
+    """Get disease distribution by location"""
+    try:
+        location_diseases = await asyncio.to_thread(get_top_diseases_by_location)
+        return JSONResponse({'location_diseases': location_diseases})
+    except Exception as e:
+        print(f"Error in disease-by-location endpoint: {e}")
+        return JSONResponse({'error': 'Failed to get location disease data'}, status_code=500)
+
+
+async def recent_detections(request: Request):
+    """Get recent detections"""
+    try:
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            limit = 10
+        recent = await asyncio.to_thread(db.get_recent_detections, limit)
+        return JSONResponse({'recent_detections': recent})
+    except Exception as e:
+        print(f"Error in recent-detections endpoint: {e}")
+        return JSONResponse({'error': 'Failed to get recent detections'}, status_code=500)
+
+
+async def health(request: Request):
+    """Liveness check; answers as soon as the process is up, whether or not warm-up has finished"""
+    return JSONResponse({'status': 'healthy', 'timestamp': datetime.now().isoformat(), 'version': '1.0.0',
+                         'ready': readiness.ready})
+
+
+async def health_ready(request: Request):
+    """Readiness check; 503 until the model and OpenCV have been loaded"""
+    status = readiness.status()
+    status['dependencies'] = breaker_states()
+    return JSONResponse(status, status_code=200 if status['ready'] else 503)
+
+
+class DeadlineMiddleware:
+    """
+    Give every request one time budget shared by all its external calls. The context
+    variable is copied into asyncio.to_thread workers, so the concurrent location, DB
+    and chat calls all draw on the same budget.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        with deadline_scope():
+            await self.app(scope, receive, send)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    os.makedirs('uploads', exist_ok=True)
+    readiness.start()
+    try:
+        yield
+    finally:
+        cpu_executor.shutdown(wait=False)
+
+
+app = Starlette(
+    routes=[
+        Route('/upload', upload, methods=['POST']),
+        Route('/chat', chat, methods=['POST']),
+        Route('/analytics', analytics, methods=['GET']),
+        Route('/heatmap', heatmap, methods=['GET']),
+        Route('/disease-by-location', disease_by_location, methods=['GET']),
+        Route('/recent-detections', recent_detections, methods=['GET']),
+        Route('/health', health, methods=['GET']),
+        Route('/health/ready', health_ready, methods=['GET']),
+    ],
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*']),
+        Middleware(DeadlineMiddleware),
+    ],
+    lifespan=lifespan,
+)
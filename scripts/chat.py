@@ -8,8 +8,12 @@ from pathlib import Path
 import requests
 from dotenv import load_dotenv
 
+from scripts.resilience import guarded_call
+
 load_dotenv()
 
+OPENROUTER_TIMEOUT = 30
+
 
 class OpenRouterChat:
     def __init__(self, api_key: Optional[str], model_name: str = "meta-llama/llama-3.1-8b-instruct:free") -> None:
@@ -33,15 +37,19 @@ class OpenRouterChat:
             "messages": messages,
             "temperature": temperature,
         }
-        try:
-            resp = requests.post(f"{self.base_url}/chat/completions", headers=headers, json=data, timeout=30)
+
+        def _post(timeout: float) -> Optional[Dict[str, Any]]:
+            resp = requests.post(f"{self.base_url}/chat/completions", headers=headers, json=data, timeout=timeout)
             if resp.status_code == 200:
                 return resp.json()
+            # Rate limiting and server errors trip the breaker; client errors are ours to fix.
+            if resp.status_code == 429 or resp.status_code >= 500:
+                raise RuntimeError(f"API error {resp.status_code}: {resp.text[:200]}")
             print(f"[openrouter] API error {resp.status_code}: {resp.text[:200]}")
             return None
-        except Exception as e:
-            print(f"[openrouter] Request error: {e}")
-            return None
+
+        # chatbot() turns None into its canned advice, so an open breaker answers instantly.
+        return guarded_call("openrouter", _post, OPENROUTER_TIMEOUT, fallback=None)
 
 
 # Use the provided OpenRouter API key
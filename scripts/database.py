@@ -3,19 +3,27 @@
 # ===============================================
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
 from dataclasses import dataclass
 from datetime import datetime
 import os
+import threading
 
-from supabase import Client, create_client
 from dotenv import load_dotenv
 
+from scripts.resilience import guarded_call
+
+if TYPE_CHECKING:
+    from supabase import Client
+
 load_dotenv()
 
 
 TABLE_DETECTIONS = "detections"
 TABLE_CHATS = "chats"
+# Supabase has no per-call timeout, so this client-wide cap bounds every query; the
+# request deadline decides whether a query is started at all.
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", 5))
 
 
 @dataclass
@@ -35,11 +43,26 @@ class SupabaseDatabase:
     """Thin Supabase wrapper for reads/writes used by the app."""
 
     def __init__(self) -> None:
-        url = os.getenv("SUPABASE_URL")
-        key = os.getenv("SUPABASE_KEY")
-        if not url or not key:
-            raise RuntimeError("Missing SUPABASE_URL or SUPABASE_KEY in environment.")
-        self.supabase: Client = create_client(url, key)
+        self._client: Optional["Client"] = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def supabase(self) -> "Client":
+        """Client created on first use, so importing this module needs no env or network."""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    url = os.getenv("SUPABASE_URL")
+                    key = os.getenv("SUPABASE_KEY")
+                    if not url or not key:
+                        raise RuntimeError("Missing SUPABASE_URL or SUPABASE_KEY in environment.")
+                    # supabase.ClientOptions is SyncClientOptions; the base class in
+                    # supabase.lib.client_options lacks fields the sync client reads.
+                    from supabase import ClientOptions, create_client
+
+                    options = ClientOptions(postgrest_client_timeout=SUPABASE_TIMEOUT)
+                    self._client = create_client(url, key, options=options)
+        return self._client
 
     # ---------- Writes ----------
     def save_detection(
@@ -61,38 +84,64 @@ class SupabaseDatabase:
             "user_ip": user_ip,
             "timestamp": (timestamp or datetime.utcnow()).isoformat(),
         }
-        try:
+
+        def _insert(_timeout: float) -> Optional[int]:
             res = self.supabase.table(TABLE_DETECTIONS).insert(payload).execute()
             return (res.data or [{}])[0].get("id")
-        except Exception as e:
-            print(f"[db] Failed to save detection: {e}")
-            return None
 
-    def save_chat_log(self, user_message: str, bot_response: str, timestamp: Optional[datetime] = None) -> Optional[int]:
+        # Writes ignore the request budget, which inference or the chat model may have used up.
+        return guarded_call("supabase", _insert, SUPABASE_TIMEOUT, fallback=None, use_deadline=False)
+
+    def save_chat_log(
+        self,
+        user_message: str,
+        bot_response: str,
+        detection_id: Optional[int] = None,
+        timestamp: Optional[datetime] = None,
+    ) -> Optional[int]:
         payload = {
+            "detection_id": detection_id,
             "user_message": user_message,
             "bot_response": bot_response,
             "timestamp": (timestamp or datetime.utcnow()).isoformat(),
         }
-        try:
+
+        def _insert(_timeout: float) -> Optional[int]:
             res = self.supabase.table(TABLE_CHATS).insert(payload).execute()
             return (res.data or [{}])[0].get("id")
-        except Exception as e:
-            print(f"[db] Failed to save chat log: {e}")
-            return None
+
+        # Writes ignore the request budget, which inference or the chat model may have used up.
+        return guarded_call("supabase", _insert, SUPABASE_TIMEOUT, fallback=None, use_deadline=False)
 
     # ---------- Reads ----------
+    def get_detected_diseases(self, detection_id: Any) -> List[str]:
+        """Class names stored for one detection (the comma-joined label written by save_detection)."""
+
+        def _select(_timeout: float) -> Any:
+            q = self.supabase.table(TABLE_DETECTIONS).select("detected_diseases").eq("id", detection_id)
+            res = q.limit(1).execute()
+            return (res.data or [{}])[0].get("detected_diseases")
+
+        value = guarded_call("supabase", _select, SUPABASE_TIMEOUT, fallback=None)
+        if isinstance(value, list):
+            return [str(v.get("class_name") if isinstance(v, dict) else v) for v in value]
+        if isinstance(value, str):
+            return [name.strip() for name in value.split(",") if name.strip()]
+        return []
+
     def fetch_detections(
         self,
         since: Optional[datetime] = None,
         fields: str = "id,timestamp,location_name,latitude,longitude,detected_diseases",
         limit: int = 10000,
     ) -> List[DetectionRecord]:
-        q = self.supabase.table(TABLE_DETECTIONS).select(fields).limit(limit).order("timestamp", desc=True)
-        if since:
-            q = q.gte("timestamp", since.isoformat())
-        res = q.execute()
-        rows = res.data or []
+        def _select(_timeout: float) -> List[Dict[str, Any]]:
+            q = self.supabase.table(TABLE_DETECTIONS).select(fields).limit(limit).order("timestamp", desc=True)
+            if since:
+                q = q.gte("timestamp", since.isoformat())
+            return q.execute().data or []
+
+        rows = guarded_call("supabase", _select, SUPABASE_TIMEOUT, fallback=[])
         out: List[DetectionRecord] = []
         for r in rows:
             ts = r.get("timestamp")
@@ -0,0 +1,555 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterator, Optional, Tuple
+import atexit
+import fcntl
+import hashlib
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+
+PACK_PREFIX = "pack:"
+LEDGER_SLACK = 1024  # ledger lines beyond 2x the live images before it is rewritten
+
+
+@dataclass
+class RetentionPolicy:
+    """Limits applied after writes; None disables a limit. Oldest-accessed images go first."""
+    max_bytes: Optional[int] = None
+    max_files: Optional[int] = None
+    max_age_seconds: Optional[float] = None
+
+    @classmethod
+    def from_env(cls) -> "RetentionPolicy":
+        def _num(name: str, cast):
+            raw = os.getenv(name)
+            return cast(raw) if raw else None
+
+        max_age_days = _num("IMAGE_STORE_MAX_AGE_DAYS", float)
+        return cls(
+            max_bytes=_num("IMAGE_STORE_MAX_BYTES", int),
+            max_files=_num("IMAGE_STORE_MAX_FILES", int),
+            max_age_seconds=max_age_days * 86400 if max_age_days else None,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return any(limit is not None for limit in (self.max_bytes, self.max_files, self.max_age_seconds))
+
+
+class ImageStore:
+    """
+    Content-addressed store for annotated upload images.
+
+    Originals live at <root>/ab/cd/<digest>.jpg with a small thumbnail under
+    <root>/thumbs/ab/cd/<digest>.jpg. Images at or below pack_max_pixels go into an
+    append-only blob file (<root>/pack/images.pack) instead of a file each, and are small
+    enough to be their own thumbnail; thumbnail_key() maps any key to its thumbnail. put() only
+    hashes the pixels and returns the key; encoding, writes and retention run on a
+    background thread, falling back to a synchronous write when the queue is full.
+
+    Several worker processes share one store. Pack appends, compaction, index reloads and
+    eviction run under an flock on <root>/.store.lock, and the on-disk pack index is the
+    source of truth. When a retention limit is set, every process also appends its writes,
+    reads and evictions to one ledger (<root>/store.idx). Retention replays only the lines
+    added since its last pass, so the limits hold for the store as a whole without walking
+    the tree. The ledger is built from disk once if it is missing.
+    """
+
+    def __init__(
+        self,
+        root: str = "uploads",
+        thumb_size: int = 256,
+        jpeg_quality: int = 90,
+        pack_max_pixels: int = 0,
+        retention: Optional[RetentionPolicy] = None,
+        retention_every: int = 50,
+        max_queued: int = 32,
+    ) -> None:
+        self.root = root
+        self.thumb_size = thumb_size
+        self.jpeg_quality = jpeg_quality
+        self.pack_max_pixels = pack_max_pixels
+        self.retention = retention or RetentionPolicy()
+        self.retention_every = retention_every
+
+        self._pack_path = os.path.join(root, "pack", "images.pack")
+        self._index_path = os.path.join(root, "pack", "images.idx")
+        self._lock_path = os.path.join(root, ".store.lock")
+        self._ledger_path = os.path.join(root, "store.idx")
+        self._lock = threading.Lock()
+        self._pending: Dict[str, np.ndarray] = {}
+        # digest -> (stored bytes incl. thumbnail, last access); kept in LRU order.
+        self._entries: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        self._pack_index: Dict[str, Tuple[int, int]] = {}
+        self._pack_dead_bytes = 0
+        self._index_stat: Optional[Tuple[int, int, int]] = None
+        # Ledger replay position: (inode, byte offset); a new inode means it was rewritten.
+        self._ledger_ino: Optional[int] = None
+        self._ledger_offset = 0
+        self._ledger_records = 0
+        # Bounded: each queued item holds a full-resolution array.
+        self._queue: "queue.Queue[Optional[Tuple[str, np.ndarray]]]" = queue.Queue(maxsize=max_queued)
+        self._writer: Optional[threading.Thread] = None
+        self._writes_since_retention = 0
+
+    @classmethod
+    def from_env(cls) -> "ImageStore":
+        return cls(
+            root=os.getenv("IMAGE_STORE_ROOT", "uploads"),
+            thumb_size=int(os.getenv("IMAGE_STORE_THUMB_SIZE", 256)),
+            pack_max_pixels=int(os.getenv("IMAGE_STORE_PACK_MAX_PIXELS", 0)),
+            retention=RetentionPolicy.from_env(),
+        )
+
+    # ---------- Paths ----------
+    @staticmethod
+    def digest(image: np.ndarray) -> str:
+        h = hashlib.blake2b(digest_size=16)
+        h.update(repr((image.shape, image.dtype.str)).encode())
+        h.update(np.ascontiguousarray(image).data)
+        return h.hexdigest()
+
+    def _shard(self, digest: str, *prefix: str) -> str:
+        return os.path.join(self.root, *prefix, digest[:2], digest[2:4], f"{digest}.jpg")
+
+    def original_path(self, digest: str) -> str:
+        return self._shard(digest)
+
+    def thumbnail_path(self, digest: str) -> str:
+        return self._shard(digest, "thumbs")
+
+    def thumbnail_key(self, key: str) -> str:
+        """Key of the thumbnail for a key returned by put(); packed images are their own thumbnail."""
+        if key.startswith(PACK_PREFIX):
+            return key
+        return self.thumbnail_path(self._digest_from_key(key))
+
+    def _is_packed(self, image: np.ndarray) -> bool:
+        return 0 < image.shape[0] * image.shape[1] <= self.pack_max_pixels
+
+    @staticmethod
+    def _digest_from_key(key: str) -> str:
+        if key.startswith(PACK_PREFIX):
+            return key[len(PACK_PREFIX):]
+        return os.path.splitext(os.path.basename(key))[0]
+
+    # ---------- Writes ----------
+    def put(self, image: np.ndarray) -> str:
+        """Queue an image for storage and return its key (a path, or pack:<digest>)."""
+        digest = self.digest(image)
+        key = f"{PACK_PREFIX}{digest}" if self._is_packed(image) else self.original_path(digest)
+        with self._lock:
+            if digest in self._entries:
+                self._entries[digest] = (self._entries[digest][0], time.time())
+                self._entries.move_to_end(digest)
+                return key
+            if digest in self._pending:
+                return key
+            self._pending[digest] = image
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait((digest, image))
+        except queue.Full:
+            # Writer is behind; write on the caller's thread rather than buffer more arrays.
+            self._store(digest, image)
+        return key
+
+    def _ensure_writer(self) -> None:
+        with self._lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._run_writer, name="image-store", daemon=True)
+                self._writer.start()
+
+    def _run_writer(self) -> None:
+        self._load_existing()
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                digest, image = item
+                self._store(digest, image)
+                if not self.retention.enabled:
+                    continue
+
+                self._writes_since_retention += 1
+                if self._writes_since_retention >= self.retention_every:
+                    self._writes_since_retention = 0
+                    self.enforce_retention()
+            finally:
+                self._queue.task_done()
+
+    def _store(self, digest: str, image: np.ndarray) -> None:
+        try:
+            size = self._write(digest, image)
+            if self.retention.enabled:
+                self._log(digest, "put", size)
+            with self._lock:
+                self._entries[digest] = (size, time.time())
+                self._entries.move_to_end(digest)
+        except Exception as e:
+            print(f"[image_store] Failed to write {digest}: {e}")
+        finally:
+            with self._lock:
+                self._pending.pop(digest, None)
+
+    def _encode(self, image: np.ndarray) -> bytes:
+        import cv2
+
+        ok, buf = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            raise ValueError("JPEG encoding failed")
+        return buf.tobytes()
+
+    def _make_thumbnail(self, image: np.ndarray) -> np.ndarray:
+        import cv2
+
+        h, w = image.shape[:2]
+        scale = self.thumb_size / max(h, w)
+        if scale >= 1:
+            return image
+        size = (max(1, int(w * scale)), max(1, int(h * scale)))
+        return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+    @staticmethod
+    def _write_file(path: str, data: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _write(self, digest: str, image: np.ndarray) -> int:
+        data = self._encode(image)
+        if self._is_packed(image):
+            self._append_to_pack(digest, data)
+            return len(data)
+        thumb = self._encode(self._make_thumbnail(image))
+        self._write_file(self.thumbnail_path(digest), thumb)
+        self._write_file(self.original_path(digest), data)
+        return len(data) + len(thumb)
+
+    # ---------- Cross-process lock ----------
+    @contextmanager
+    def _file_lock(self, shared: bool = False) -> Iterator[None]:
+        """flock shared by every process using this root. Always taken before self._lock."""
+        os.makedirs(self.root, exist_ok=True)
+        with open(self._lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    # ---------- Pack file ----------
+    def _refresh_pack_index(self) -> None:
+        """Reload the pack index if another process changed it. Caller holds the file lock."""
+        try:
+            st = os.stat(self._index_path)
+        except FileNotFoundError:
+            with self._lock:
+                self._pack_index, self._pack_dead_bytes, self._index_stat = {}, 0, None
+            return
+        stamp = (st.st_ino, st.st_size, st.st_mtime_ns)
+        if stamp == self._index_stat:
+            return
+        index: Dict[str, Tuple[int, int]] = {}
+        dead = 0
+        with open(self._index_path, "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) < 3:
+                    continue
+                digest, offset, length = parts[0], int(parts[1]), int(parts[2])
+                if offset < 0:
+                    dropped = index.pop(digest, None)
+                    dead += dropped[1] if dropped else 0
+                else:
+                    index[digest] = (offset, length)
+        with self._lock:
+            self._pack_index, self._pack_dead_bytes, self._index_stat = index, dead, stamp
+
+    def _append_to_pack(self, digest: str, data: bytes) -> None:
+        os.makedirs(os.path.dirname(self._pack_path), exist_ok=True)
+        with self._file_lock():
+            self._refresh_pack_index()
+            with open(self._pack_path, "ab") as f:
+                f.seek(0, os.SEEK_END)
+                offset = f.tell()
+                f.write(data)
+            with open(self._index_path, "a", encoding="utf-8") as f:
+                f.write(f"{digest} {offset} {len(data)} {time.time():.0f}\n")
+            self._index_stat = None  # our own append; re-read on next refresh
+            with self._lock:
+                self._pack_index[digest] = (offset, len(data))
+
+    def _drop_from_pack(self, digest: str) -> None:
+        """Caller holds the file lock."""
+        self._refresh_pack_index()
+        with self._lock:
+            entry = self._pack_index.pop(digest, None)
+            if entry is None:
+                return
+            self._pack_dead_bytes += entry[1]
+        with open(self._index_path, "a", encoding="utf-8") as f:
+            f.write(f"{digest} -1 0\n")
+        self._index_stat = None
+
+    def compact_pack(self) -> None:
+        """Rewrite the pack file keeping only live blobs."""
+        with self._file_lock():
+            self._compact_pack_locked()
+
+    def _compact_pack_locked(self) -> None:
+        if not os.path.exists(self._pack_path):
+            return
+        self._refresh_pack_index()
+        with self._lock:
+            live = dict(self._pack_index)
+        new_index: Dict[str, Tuple[int, int]] = {}
+        tmp_pack, tmp_index = f"{self._pack_path}.tmp", f"{self._index_path}.tmp"
+        with open(self._pack_path, "rb") as src, open(tmp_pack, "wb") as dst, \
+                open(tmp_index, "w", encoding="utf-8") as idx:
+            for digest, (offset, length) in live.items():
+                src.seek(offset)
+                new_offset = dst.tell()
+                dst.write(src.read(length))
+                idx.write(f"{digest} {new_offset} {length}\n")
+                new_index[digest] = (new_offset, length)
+        os.replace(tmp_pack, self._pack_path)
+        os.replace(tmp_index, self._index_path)
+        with self._lock:
+            self._pack_index, self._pack_dead_bytes, self._index_stat = new_index, 0, None
+
+    # ---------- Reads ----------
+    def get(self, key: str) -> Optional[bytes]:
+        """Return JPEG bytes for a key from put() or thumbnail_key(), or None if it is gone."""
+        digest = self._digest_from_key(key)
+        is_thumb = key == self.thumbnail_path(digest)
+        with self._lock:
+            pending = self._pending.get(digest)
+            if digest in self._entries:
+                self._entries[digest] = (self._entries[digest][0], time.time())
+                self._entries.move_to_end(digest)
+        if pending is not None:
+            return self._encode(self._make_thumbnail(pending) if is_thumb else pending)
+
+        if key.startswith(PACK_PREFIX):
+            with self._file_lock(shared=True):
+                self._refresh_pack_index()
+                with self._lock:
+                    packed = self._pack_index.get(digest)
+                if packed is None:
+                    return None
+                with open(self._pack_path, "rb") as f:
+                    f.seek(packed[0])
+                    data = f.read(packed[1])
+        else:
+            try:
+                with open(self.thumbnail_path(digest) if is_thumb else self.original_path(digest), "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                return None
+        if self.retention.enabled:
+            self._log(digest, "get")  # share recency with the other processes' retention passes
+        return data
+
+    # ---------- Ledger ----------
+    # One line per event, "<digest> <put|get|del> <bytes> <unix time>", appended with
+    # O_APPEND under the shared lock; rewrites take the exclusive lock.
+    def _append_ledger(self, lines: str) -> None:
+        """Caller holds the file lock (shared is enough)."""
+        fd = os.open(self._ledger_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, lines.encode("utf-8"))
+        finally:
+            os.close(fd)
+
+    def _log(self, digest: str, op: str, size: int = 0) -> None:
+        with self._file_lock(shared=True):
+            self._append_ledger(f"{digest} {op} {size} {time.time():.3f}\n")
+
+    def _replay_ledger(self) -> None:
+        """Apply ledger lines added since the last replay to the LRU state. Caller holds the file lock."""
+        try:
+            st = os.stat(self._ledger_path)
+        except FileNotFoundError:
+            return
+        if st.st_ino != self._ledger_ino:
+            # First replay in this process, or another process rewrote the ledger.
+            self._ledger_ino, self._ledger_offset, self._ledger_records = st.st_ino, 0, 0
+            with self._lock:
+                self._entries = OrderedDict()
+        with open(self._ledger_path, "rb") as f:
+            f.seek(self._ledger_offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1  # a line still being appended is picked up next time
+        self._ledger_offset += end
+        with self._lock:
+            for line in data[:end].decode("utf-8").splitlines():
+                parts = line.split()
+                if len(parts) != 4:
+                    continue
+                digest, op, size, ts = parts[0], parts[1], int(parts[2]), float(parts[3])
+                self._ledger_records += 1
+                if op == "del":
+                    self._entries.pop(digest, None)
+                    continue
+                if op == "get":
+                    if digest not in self._entries:
+                        continue
+                    size = self._entries[digest][0]
+                self._entries[digest] = (size, ts)
+                self._entries.move_to_end(digest)
+
+    def _rewrite_ledger(self, entries: "OrderedDict[str, Tuple[int, float]]") -> None:
+        """Replace the ledger with one put line per live image. Caller holds the exclusive file lock."""
+        tmp = f"{self._ledger_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for digest, (size, last_access) in entries.items():
+                f.write(f"{digest} put {size} {last_access:.3f}\n")
+        os.replace(tmp, self._ledger_path)
+        st = os.stat(self._ledger_path)
+        self._ledger_ino, self._ledger_offset, self._ledger_records = st.st_ino, st.st_size, len(entries)
+        with self._lock:
+            self._entries = entries
+
+    def _scan_disk(self) -> "OrderedDict[str, Tuple[int, float]]":
+        """
+        Every stored image as digest -> (bytes incl. thumbnail, last access), oldest first.
+        File mtime and the pack append time stand in for last access. Only used to build a
+        missing ledger; caller holds the exclusive file lock.
+        """
+        found = []
+        self._refresh_pack_index()
+        if os.path.exists(self._index_path):
+            appended: Dict[str, float] = {}
+            fallback = os.path.getmtime(self._index_path)
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) == 4:
+                        appended[parts[0]] = float(parts[3])
+            with self._lock:
+                packed = dict(self._pack_index)
+            found.extend((appended.get(d, fallback), d, length) for d, (_, length) in packed.items())
+
+        skip = {os.path.join(self.root, "thumbs"), os.path.join(self.root, "pack")}
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [d for d in dirnames if os.path.join(dirpath, d) not in skip]
+            for name in filenames:
+                if not name.endswith(".jpg"):
+                    continue
+                path = os.path.join(dirpath, name)
+                digest = os.path.splitext(name)[0]
+                if path != self.original_path(digest):
+                    continue  # legacy un-sharded uploads are left alone
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                found.append((st.st_mtime, digest, st.st_size))
+
+        on_disk: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        for mtime, digest, size in sorted(found):
+            thumb = self.thumbnail_path(digest)
+            size += os.path.getsize(thumb) if os.path.exists(thumb) else 0
+            on_disk[digest] = (size, mtime)
+        return on_disk
+
+    # ---------- Retention ----------
+    def _load_existing(self) -> None:
+        """Seed LRU state from the ledger on writer start-up."""
+        if not self.retention.enabled:
+            # Without limits nothing is tracked. Drop a stale ledger so that turning
+            # retention back on rebuilds it from disk instead of missing images.
+            if os.path.exists(self._ledger_path):
+                with self._file_lock():
+                    try:
+                        os.remove(self._ledger_path)
+                    except FileNotFoundError:
+                        pass
+            return
+        with self._file_lock(shared=True):
+            self._replay_ledger()
+        if self._ledger_ino is not None:
+            return
+        with self._file_lock():
+            self._replay_ledger()  # another process may have built it meanwhile
+            if self._ledger_ino is None:
+                self._rewrite_ledger(self._scan_disk())
+
+    def _evict(self, digest: str) -> None:
+        """Caller holds the file lock."""
+        self._drop_from_pack(digest)
+        for path in (self.original_path(digest), self.thumbnail_path(digest)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def enforce_retention(self) -> int:
+        """Evict least-recently-used images until the policy holds; returns the count evicted."""
+        policy = self.retention
+        if not policy.enabled:
+            return 0
+        now = time.time()
+        with self._file_lock():
+            self._replay_ledger()
+            with self._lock:
+                ordered = sorted(self._entries.items(), key=lambda item: item[1][1])
+
+            victims = []
+            total = sum(size for _, (size, _) in ordered)
+            count = len(ordered)
+            for digest, (size, last_access) in ordered:
+                too_old = policy.max_age_seconds is not None and now - last_access > policy.max_age_seconds
+                too_big = policy.max_bytes is not None and total > policy.max_bytes
+                too_many = policy.max_files is not None and count > policy.max_files
+                if not (too_old or too_big or too_many):
+                    break
+                victims.append(digest)
+                total -= size
+                count -= 1
+
+            for digest in victims:
+                self._evict(digest)
+            evicted = set(victims)
+            live: "OrderedDict[str, Tuple[int, float]]" = OrderedDict(
+                (d, v) for d, v in ordered if d not in evicted
+            )
+            if self._ledger_records > 2 * len(live) + LEDGER_SLACK:
+                self._rewrite_ledger(live)
+            else:
+                with self._lock:
+                    self._entries = live
+                if victims:
+                    self._append_ledger("".join(f"{d} del 0 {now:.3f}\n" for d in victims))
+
+            pack_size = os.path.getsize(self._pack_path) if os.path.exists(self._pack_path) else 0
+            if pack_size and self._pack_dead_bytes * 2 > pack_size:
+                self._compact_pack_locked()
+        return len(victims)
+
+    def flush(self) -> None:
+        """Block until all queued writes are on disk."""
+        if self._writer is not None:
+            self._queue.join()
+
+    def close(self) -> None:
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+
+
+# Singleton used by other modules
+image_store = ImageStore.from_env()
+atexit.register(image_store.close)
@@ -1,10 +1,65 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, Tuple, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 import os
+import threading
 
 import numpy as np
-from ultralytics import YOLO
+
+from scripts.postprocess import Detections, min_confidence, nms, postprocess
+
+MODEL_PATH = "assets/best.pt"
+# Every gunicorn worker loads its own model; give each worker's torch intra-op pool its
+# share of the cores instead of letting all of them claim every core.
+TORCH_THREADS = int(os.getenv("TORCH_NUM_THREADS", 0)) or max(
+    1, (os.cpu_count() or 1) // max(1, int(os.getenv("WEB_CONCURRENCY", 1)))
+)
+# Confidence thresholds are per class; see assets/class_thresholds.json and scripts/postprocess.py.
+
+# Sliced inference: large field/drone shots are cut into overlapping tiles so small
+# lesions survive the model's downscale. Off unless SLICED_INFERENCE=1 or sliced=True.
+SLICED_INFERENCE = os.getenv("SLICED_INFERENCE", "0").lower() in ("1", "true", "yes")
+TILE_SIZE = 640
+TILE_OVERLAP = 0.2
+TILED_MIN_SIDE = 1280  # only images with a longer side above this are sliced
+TILE_BATCH_SIZE = 16  # bounds peak memory on very large images
+TILE_NMS_IOU = 0.5
+TILE_EDGE_MARGIN = 4  # px; tile boxes this close to an inner tile edge are treated as cut off
+# Background pre-filter: a tile is skipped when it has almost no vegetation pixels
+# and almost no texture (sky, soil, blank frame).
+TILE_MIN_GREEN_FRACTION = 0.03
+TILE_MIN_STD = 12.0
+
+_model: Any = None
+_model_lock = threading.Lock()
+# Ultralytics predictors are not thread-safe, so calls on the shared model are serialised.
+_predict_lock = threading.Lock()
+
+
+def load_model(model_path: str = MODEL_PATH) -> Any:
+    """
+    Return the process-wide YOLO model, loading it on first use.
+    ultralytics (and torch through it) is imported here rather than at module import
+    so the web process starts quickly.
+    """
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                if not os.path.exists(model_path):
+                    raise FileNotFoundError(f"Model file not found at {model_path}")
+                import torch
+                from ultralytics import YOLO
+
+                torch.set_num_threads(TORCH_THREADS)
+                _model = YOLO(model_path)
+    return _model
+
+
+def predict(model: Any, source: Any, **kwargs: Any) -> Any:
+    """Run the shared model; one prediction at a time per process."""
+    with _predict_lock:
+        return model(source, **kwargs)
 
 
 def _to_image_array(image: Union[str, np.ndarray]) -> np.ndarray:
@@ -22,65 +77,151 @@ def _to_image_array(image: Union[str, np.ndarray]) -> np.ndarray:
     return np.zeros((512, 512, 3), dtype=np.uint8)
 
 
-def inference(image: Union[str, np.ndarray]) -> Tuple[np.ndarray, Dict[int, str], List[Dict[str, Any]]]:
+def _tile_origins(length: int, tile: int, stride: int) -> List[int]:
+    """Start offsets covering [0, length) with the last tile flush against the edge."""
+    if length <= tile:
+        return [0]
+    origins = list(range(0, length - tile, stride))
+    origins.append(length - tile)
+    return origins
+
+
+def _tile_has_content(tile: np.ndarray) -> bool:
+    """Cheap background check on a 4x-subsampled copy of a BGR tile."""
+    small = tile[::4, ::4].astype(np.int16)
+    b, g, r = small[..., 0], small[..., 1], small[..., 2]
+    # Excess-green index (2G - R - B) picks out leaf pixels regardless of brightness.
+    green_fraction = float(np.count_nonzero(2 * g - r - b > 20)) / max(g.size, 1)
+    if green_fraction >= TILE_MIN_GREEN_FRACTION:
+        return True
+    # Texture is measured on luminance: a std over the raw B, G, R values would count the
+    # gap between channel means of a flat coloured tile (bare soil) as texture.
+    gray = 0.114 * b + 0.587 * g + 0.299 * r
+    return float(gray.std()) >= TILE_MIN_STD
+
+
+def _drop_cut_boxes(data: np.ndarray, x0: int, y0: int, tile_w: int, tile_h: int,
+                    width: int, height: int) -> np.ndarray:
+    """
+    Drop tile-local boxes touching an inner tile edge. They are fragments of something
+    larger; a neighbouring tile (thanks to the overlap) or the full-frame pass sees it whole.
+    """
+    m = TILE_EDGE_MARGIN
+    cut = (
+        ((x0 > 0) & (data[:, 0] <= m))
+        | ((x0 + tile_w < width) & (data[:, 2] >= tile_w - m))
+        | ((y0 > 0) & (data[:, 1] <= m))
+        | ((y0 + tile_h < height) & (data[:, 3] >= tile_h - m))
+    )
+    return data[~cut]
+
+
+def _draw_detections(image: np.ndarray, detections: Detections) -> np.ndarray:
+    """Draw kept boxes on a copy of the full-resolution image."""
+    import cv2
+
+    annotated = image.copy()
+    thickness = max(2, round(max(image.shape[:2]) / 640))
+    for box, conf, cls_id in zip(detections.xyxy, detections.confidence, detections.class_id):
+        x1, y1, x2, y2 = (int(v) for v in box)
+        cv2.rectangle(annotated, (x1, y1), (x2, y2), (0, 0, 255), thickness)
+        caption = f"{detections.class_name(cls_id)} {conf:.2f}"
+        cv2.putText(annotated, caption, (x1, max(y1 - 6, 12)), cv2.FONT_HERSHEY_SIMPLEX,
+                    0.5 * thickness, (0, 0, 255), thickness)
+    return annotated
+
+
+def _boxes_data(result: Any) -> np.ndarray:
+    """Raw [x1, y1, x2, y2, conf, cls] rows of one YOLO result as a float32 array."""
+    if result.boxes is None or len(result.boxes) == 0:
+        return np.zeros((0, 6), dtype=np.float32)
+    return result.boxes.data.cpu().numpy().astype(np.float32)
+
+
+def sliced_inference(model: Any, image: np.ndarray) -> Tuple[np.ndarray, Dict[int, str], Detections]:
+    """
+    Run YOLO over overlapping tiles of a large image plus one downscaled full-frame pass,
+    and merge with cross-tile NMS. Tiles that look like empty background are skipped
+    before reaching the model.
+    """
+    height, width = image.shape[:2]
+    stride = max(1, int(TILE_SIZE * (1 - TILE_OVERLAP)))
+    tiles: List[np.ndarray] = []
+    offsets: List[Tuple[int, int]] = []
+    for y0 in _tile_origins(height, TILE_SIZE, stride):
+        for x0 in _tile_origins(width, TILE_SIZE, stride):
+            tile = image[y0:y0 + TILE_SIZE, x0:x0 + TILE_SIZE]
+            if _tile_has_content(tile):
+                tiles.append(tile)
+                offsets.append((x0, y0))
+
+    classes: Dict[int, str] = dict(model.names or {})
+    conf = min_confidence(classes)
+    # Whole-leaf classes are often larger than a tile. The full-frame pass (the model
+    # downscales it to its input size) is what finds those; tiles add the small lesions.
+    rows: List[np.ndarray] = [_boxes_data(predict(model, image, conf=conf, verbose=False)[0])]
+    for start in range(0, len(tiles), TILE_BATCH_SIZE):
+        batch = tiles[start:start + TILE_BATCH_SIZE]
+        results = predict(model, batch, conf=conf, verbose=False)
+        for tile, (x0, y0), r in zip(batch, offsets[start:start + TILE_BATCH_SIZE], results):
+            tile_h, tile_w = tile.shape[:2]
+            data = _drop_cut_boxes(_boxes_data(r), x0, y0, tile_w, tile_h, width, height)
+            data[:, [0, 2]] += x0
+            data[:, [1, 3]] += y0
+            rows.append(data)
+
+    data = np.concatenate(rows) if rows else np.zeros((0, 6), dtype=np.float32)
+    if data.shape[0]:
+        # Per-class NMS in one pass merges duplicates from overlapping tiles and the
+        # full-frame pass: shift each class into its own coordinate range.
+        shifted = data[:, :4] + (data[:, 5:6] * float(max(height, width) + 1))
+        data = data[nms(shifted, data[:, 4], TILE_NMS_IOU)]
+
+    detections = postprocess(data, classes)
+    return _draw_detections(image, detections), classes, detections
+
+
+def inference(
+    image: Union[str, np.ndarray], sliced: Optional[bool] = None
+) -> Tuple[np.ndarray, Dict[int, str], Detections]:
     """
     Run YOLO inference and return (annotated_image, classes_map, detections).
-    detections: [{class_id, class_name, confidence, bbox:[x1,y1,x2,y2]}]
+    detections: array-backed Detections after per-class thresholds, class-agnostic NMS and top-k.
+    sliced: force tiled inference on/off; None follows SLICED_INFERENCE and image size.
     """
-    model_path = "assets/best.pt"
     base_image = _to_image_array(image)
 
     try:
-        if not os.path.exists(model_path):
-            raise FileNotFoundError(f"Model file not found at {model_path}")
-
-        model = YOLO(model_path)
-        results = model(image, conf=0.25)  # lower conf to avoid 'no results' in borderline cases
-
-        annotated = base_image
-        classes: Dict[int, str] = {}
-        detections: List[Dict[str, Any]] = []
-
-        for r in results:
-            annotated = r.plot()
-            classes = r.names or {}
-            cls_list = r.boxes.cls.tolist() if r.boxes and r.boxes.cls is not None else []
-            conf_list = r.boxes.conf.tolist() if r.boxes and r.boxes.conf is not None else []
-            xyxy = r.boxes.xyxy.tolist() if r.boxes and r.boxes.xyxy is not None else []
-
-            for cls_id, conf, box in zip(cls_list, conf_list, xyxy):
-                cls_i = int(cls_id)
-                detections.append(
-                    {
-                        "class_id": cls_i,
-                        "class_name": classes.get(cls_i, "Unknown"),
-                        "confidence": float(conf),
-                        "bbox": [float(v) for v in box],
-                    }
-                )
-
-        return annotated, classes, detections
+        model = load_model()
+
+        use_sliced = SLICED_INFERENCE if sliced is None else sliced
+        if use_sliced and max(base_image.shape[:2]) > TILED_MIN_SIDE:
+            return sliced_inference(model, base_image)
+
+        classes: Dict[int, str] = dict(model.names or {})
+        results = predict(model, image, conf=min_confidence(classes), verbose=False)
+        data = _boxes_data(results[0]) if results else np.zeros((0, 6), dtype=np.float32)
+        detections = postprocess(data, classes)
+        return _draw_detections(base_image, detections), classes, detections
 
     except Exception as e:
         print(f"[inference] Error: {e}")
-        return base_image, {}, []
+        return base_image, {}, Detections.empty()
 
 
-def get_disease_info(classes: Dict[int, str], detections: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def get_disease_info(classes: Dict[int, str], detections: Detections) -> List[Dict[str, Any]]:
     """
-    Map detections to a simpler disease info list.
+    One entry per detected class with its best confidence and box count, best first.
     """
-    info: List[Dict[str, Any]] = []
-    for det in detections:
-        cls_id = det.get("class_id")
-        info.append(
-            {
-                "class_id": cls_id,
-                "class_name": classes.get(cls_id, det.get("class_name", "Unknown")),
-                "confidence": det.get("confidence"),
-            }
-        )
-    return info
+    return [
+        {
+            "class_id": cls_id,
+            "class_name": classes.get(cls_id, detections.class_name(cls_id)),
+            "confidence": round(confidence, 4),
+            "count": count,
+        }
+        for cls_id, confidence, count in detections.per_class()
+    ]
 
 
 if __name__ == "__main__":
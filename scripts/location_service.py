@@ -3,14 +3,22 @@ from __future__ import annotations
 from typing import Any, Dict, Optional
 
 import requests
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut, GeocoderServiceError
+
+from scripts.resilience import guarded_call
+
+
+IP_API_TIMEOUT = 10
+NOMINATIM_TIMEOUT = 10
 
 
 def get_location_from_ip(ip_address: str) -> Optional[Dict[str, Any]]:
     """Use ip-api.com to resolve an IP to lat/lon/city."""
-    try:
-        resp = requests.get(f"http://ip-api.com/json/{ip_address}", timeout=10)
+
+    def _lookup(timeout: float) -> Optional[Dict[str, Any]]:
+        resp = requests.get(f"http://ip-api.com/json/{ip_address}", timeout=timeout)
+        # Rate limiting and server errors mean the service is degraded; count them.
+        if resp.status_code == 429 or resp.status_code >= 500:
+            raise RuntimeError(f"ip-api returned {resp.status_code}")
         if resp.status_code == 200:
             data = resp.json()
             if data.get("status") == "success":
@@ -22,16 +30,20 @@ def get_location_from_ip(ip_address: str) -> Optional[Dict[str, Any]]:
                     "region": data.get("regionName"),
                     "city": data.get("city"),
                 }
-    except Exception as e:
-        print(f"[location] IP lookup error: {e}")
-    return None
+        return None
+
+    return guarded_call("ip-api", _lookup, IP_API_TIMEOUT, fallback=None)
 
 
 def get_location_from_coordinates(lat: float, lon: float) -> Optional[Dict[str, Any]]:
     """Reverse geocode coordinates to a readable address."""
-    try:
+
+    def _reverse(timeout: float) -> Optional[Dict[str, Any]]:
+        # geopy is only needed here; importing it lazily keeps app start-up fast.
+        from geopy.geocoders import Nominatim
+
         geolocator = Nominatim(user_agent="plant_disease_detector")
-        location = geolocator.reverse((lat, lon), language="en", timeout=10)
+        location = geolocator.reverse((lat, lon), language="en", timeout=timeout)
         if location:
             return {
                 "location_name": location.address,
@@ -39,18 +51,20 @@ def get_location_from_coordinates(lat: float, lon: float) -> Optional[Dict[str,
                 "region": location.raw.get("address", {}).get("state", ""),
                 "city": location.raw.get("address", {}).get("city", ""),
             }
-    except (GeocoderTimedOut, GeocoderServiceError) as e:
-        print(f"[location] Geocoding error: {e}")
-    except Exception as e:
-        print(f"[location] Reverse geocode error: {e}")
-    return None
+        return None
+
+    return guarded_call("nominatim", _reverse, NOMINATIM_TIMEOUT, fallback=None)
 
 
 def get_user_ip(request) -> Optional[str]:
-    """Extract client IP from Flask request."""
+    """Extract client IP from a Flask or Starlette request."""
     if request.headers.getlist("X-Forwarded-For"):
         return request.headers.getlist("X-Forwarded-For")[0]
-    return request.remote_addr
+    if hasattr(request, "remote_addr"):
+        return request.remote_addr
+    # Starlette exposes the peer address as request.client instead of remote_addr.
+    client = getattr(request, "client", None)
+    return client.host if client else None
 
 
 def validate_coordinates(lat: Any, lon: Any):
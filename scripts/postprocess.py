@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import json
+
+import numpy as np
+
+
+ASSETS_DIR = Path(__file__).resolve().parent.parent / "assets"
+CLASS_THRESHOLDS_PATH = ASSETS_DIR / "class_thresholds.json"
+
+DEFAULT_CONFIDENCE = 0.25
+AGNOSTIC_NMS_IOU = 0.6  # overlapping boxes of different disease classes on one lesion keep the best
+MAX_DETECTIONS = 20  # top-k per image after NMS
+
+
+@dataclass
+class Detections:
+    """Array-backed detections for one image: xyxy (N, 4), confidence (N,), class_id (N,), best first."""
+    xyxy: np.ndarray
+    confidence: np.ndarray
+    class_id: np.ndarray
+    names: Dict[int, str] = field(default_factory=dict)
+
+    @classmethod
+    def empty(cls, names: Optional[Dict[int, str]] = None) -> "Detections":
+        return cls(
+            xyxy=np.zeros((0, 4), dtype=np.float32),
+            confidence=np.zeros((0,), dtype=np.float32),
+            class_id=np.zeros((0,), dtype=np.int64),
+            names=dict(names or {}),
+        )
+
+    def __len__(self) -> int:
+        return int(self.class_id.shape[0])
+
+    def class_name(self, class_id: int) -> str:
+        return self.names.get(int(class_id), "Unknown")
+
+    def per_class(self) -> List[Tuple[int, float, int]]:
+        """(class_id, max confidence, count) for each detected class, highest confidence first."""
+        if not len(self):
+            return []
+        ids, inverse, counts = np.unique(self.class_id, return_inverse=True, return_counts=True)
+        best = np.zeros(ids.shape[0], dtype=np.float32)
+        np.maximum.at(best, inverse, self.confidence)
+        order = np.argsort(-best, kind="stable")
+        return [(int(ids[i]), float(best[i]), int(counts[i])) for i in order]
+
+
+@lru_cache(maxsize=1)
+def _load_threshold_config() -> Tuple[float, Tuple[Tuple[str, float], ...]]:
+    try:
+        with open(CLASS_THRESHOLDS_PATH, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError) as e:
+        print(f"[postprocess] Warning: could not load {CLASS_THRESHOLDS_PATH}: {e}")
+        return DEFAULT_CONFIDENCE, ()
+    default = float(raw.get("default", DEFAULT_CONFIDENCE))
+    overrides = tuple((str(k), float(v)) for k, v in (raw.get("classes") or {}).items())
+    return default, overrides
+
+
+def class_threshold_table(names: Dict[int, str]) -> np.ndarray:
+    """
+    Per-class confidence thresholds indexed by class id. Entries in class_thresholds.json
+    may be keyed by class name or by class id.
+    """
+    default, overrides = _load_threshold_config()
+    size = max(names.keys(), default=-1) + 1
+    table = np.full(size, default, dtype=np.float32)
+    by_name = {name: cls_id for cls_id, name in names.items()}
+    for key, value in overrides:
+        cls_id = by_name.get(key)
+        if cls_id is None and key.isdigit():
+            cls_id = int(key)
+        if cls_id is not None and cls_id < size:
+            table[cls_id] = value
+    return table
+
+
+def min_confidence(names: Dict[int, str]) -> float:
+    """Lowest per-class threshold; pass this to the model so no class is cut off early."""
+    table = class_threshold_table(names)
+    return float(table.min()) if table.size else _load_threshold_config()[0]
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float) -> np.ndarray:
+    """Greedy NMS; returns indices of kept boxes ordered by descending score."""
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    order = scores.argsort()[::-1]
+    keep: List[int] = []
+    while order.size:
+        i = order[0]
+        keep.append(int(i))
+        rest = order[1:]
+        w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = w * h
+        iou = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.asarray(keep, dtype=np.int64)
+
+
+def postprocess(
+    data: np.ndarray,
+    names: Dict[int, str],
+    iou_threshold: Optional[float] = AGNOSTIC_NMS_IOU,
+    top_k: int = MAX_DETECTIONS,
+) -> Detections:
+    """
+    Turn raw YOLO box rows [x1, y1, x2, y2, conf, cls] (boxes.data) into Detections:
+    per-class confidence thresholds, class-agnostic NMS, then top-k.
+    """
+    data = np.asarray(data, dtype=np.float32).reshape(-1, 6)
+    if not data.shape[0]:
+        return Detections.empty(names)
+
+    xyxy, conf, cls = data[:, :4], data[:, 4], data[:, 5].astype(np.int64)
+    default = _load_threshold_config()[0]
+    table = class_threshold_table(names)
+    if not table.size:
+        table = np.array([default], dtype=np.float32)
+    in_table = (cls >= 0) & (cls < table.shape[0])
+    thresholds = np.where(in_table, table[np.clip(cls, 0, table.shape[0] - 1)], default)
+    mask = conf >= thresholds
+    xyxy, conf, cls = xyxy[mask], conf[mask], cls[mask]
+
+    if iou_threshold is not None and conf.shape[0]:
+        order = nms(xyxy, conf, iou_threshold)
+    else:
+        order = np.argsort(-conf, kind="stable")
+    order = order[:top_k]
+
+    return Detections(xyxy=xyxy[order], confidence=conf[order], class_id=cls[order], names=dict(names))
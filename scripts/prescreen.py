@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+import os
+
+import numpy as np
+
+
+PRESCREEN_ENABLED = os.getenv("PRESCREEN_ENABLED", "1").lower() in ("1", "true", "yes")
+SCREEN_SIZE = 320  # longest side of the copy all checks run on
+MIN_SIDE = 160  # shorter side of the original, px
+BLUR_MIN_VARIANCE = 40.0  # Laplacian variance on the SCREEN_SIZE copy
+MIN_GREEN_FRACTION = 0.05  # some green tissue is always required
+MIN_PLANT_FRACTION = 0.08  # green plus yellow-brown (diseased) tissue
+YELLOW_BROWN_PER_GREEN = 3.0  # yellow-brown counts up to this multiple of the green area
+
+# OpenCV hue is 0-179. Green proper starts past yellow at 30, and pixels must also be
+# green-dominant (excess green 2G - R - B above EXCESS_GREEN_MARGIN). Yellow-brown (10-30)
+# covers chlorotic and necrotic tissue but also human skin (H 14-17), so it only adds to
+# a green area, never replaces it.
+GREEN_HUE_RANGE = (30, 95)
+YELLOW_BROWN_HUE_RANGE = (10, 30)
+EXCESS_GREEN_MARGIN = 20
+PLANT_MIN_SATURATION = 40
+PLANT_MIN_VALUE = 40
+
+REJECTION_MESSAGES = {
+    "unreadable": "The image could not be read. Please upload a JPEG or PNG photo.",
+    "too_small": "The image resolution is too low. Please take a closer, higher-resolution photo of the leaf.",
+    "blurry": "The image is too blurry. Please hold the camera steady and retake the photo.",
+    "no_plant": "No plant leaves were found in the image. Please photograph the affected leaf.",
+}
+
+
+@dataclass
+class ScreenResult:
+    """Outcome of the pre-screening checks; reason is None when the image passes."""
+    ok: bool
+    reason: Optional[str] = None
+    metrics: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def message(self) -> str:
+        return REJECTION_MESSAGES.get(self.reason, "") if self.reason else ""
+
+
+def _downscale(image: np.ndarray) -> np.ndarray:
+    import cv2
+
+    h, w = image.shape[:2]
+    scale = SCREEN_SIZE / max(h, w)
+    if scale >= 1:
+        return image
+    return cv2.resize(image, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+
+
+def blur_score(gray: np.ndarray) -> float:
+    """Variance of the Laplacian; low values mean few sharp edges."""
+    import cv2
+
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+def _hue_mask(hsv: np.ndarray, hue_range: Tuple[int, int]) -> np.ndarray:
+    import cv2
+
+    lower = np.array([hue_range[0], PLANT_MIN_SATURATION, PLANT_MIN_VALUE], dtype=np.uint8)
+    upper = np.array([hue_range[1], 255, 255], dtype=np.uint8)
+    return cv2.inRange(hsv, lower, upper) > 0
+
+
+def plant_fractions(bgr: np.ndarray) -> Tuple[float, float]:
+    """(green fraction, green + yellow-brown fraction) of pixels that look like leaf tissue."""
+    import cv2
+
+    hsv = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
+    b, g, r = (bgr[..., i].astype(np.int16) for i in range(3))
+    green = _hue_mask(hsv, GREEN_HUE_RANGE) & (2 * g - r - b > EXCESS_GREEN_MARGIN)
+    yellow_brown = _hue_mask(hsv, YELLOW_BROWN_HUE_RANGE)
+    total = max(green.size, 1)
+    n_green = int(np.count_nonzero(green))
+    n_yellow_brown = min(int(np.count_nonzero(yellow_brown & ~green)), YELLOW_BROWN_PER_GREEN * n_green)
+    return n_green / total, (n_green + n_yellow_brown) / total
+
+
+def prescreen(image: Optional[np.ndarray]) -> ScreenResult:
+    """
+    Cheap checks run before YOLO so selfies, blank frames and badly blurred shots
+    return immediately. Checks are ordered cheapest first and stop at the first failure.
+    """
+    if image is None or not isinstance(image, np.ndarray) or image.ndim != 3 or image.size == 0:
+        return ScreenResult(ok=False, reason="unreadable")
+    if not PRESCREEN_ENABLED:
+        return ScreenResult(ok=True)
+
+    import cv2
+
+    h, w = image.shape[:2]
+    metrics: Dict[str, float] = {"width": float(w), "height": float(h)}
+    if min(h, w) < MIN_SIDE:
+        return ScreenResult(ok=False, reason="too_small", metrics=metrics)
+
+    small = _downscale(image)
+    green, plant = plant_fractions(small)
+    metrics["green_fraction"] = round(green, 4)
+    metrics["plant_fraction"] = round(plant, 4)
+    if green < MIN_GREEN_FRACTION or plant < MIN_PLANT_FRACTION:
+        return ScreenResult(ok=False, reason="no_plant", metrics=metrics)
+
+    metrics["blur_score"] = round(blur_score(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)), 2)
+    if metrics["blur_score"] < BLUR_MIN_VARIANCE:
+        return ScreenResult(ok=False, reason="blurry", metrics=metrics)
+
+    return ScreenResult(ok=True, metrics=metrics)
@@ -0,0 +1,96 @@
+"""
+Import-time profile of the API process.
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter from the repo
+root and prints the wall time of the whole import, the modules the target imports
+directly (by cumulative time) and the self time of each top-level package summed over
+every nesting depth. Compare WARMUP=off against the default to see what the
+lazy imports save.
+
+    python scripts/profile_startup.py            # profiles `import asgi`
+    python scripts/profile_startup.py app -n 25
+"""
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Dict, List, Tuple
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _parse(stderr: str) -> List[Tuple[int, str, int, int]]:
+    """(depth, module, self_us, cumulative_us) per -X importtime line, in output order."""
+    # Lines look like: "import time:       412 |       1203 |   numpy.core"; two spaces per level
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cum_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        rows.append((depth, name.strip(), int(self_us), int(cum_us)))
+    return rows
+
+
+def profile_import(module: str) -> Tuple[float, List[Tuple[str, int, int]], List[Tuple[str, int, int]]]:
+    """
+    Cold-import profile of module: (wall seconds, direct children, packages). Direct children
+    are [(module, self_us, cumulative_us)] imported by the target itself, slowest first;
+    packages are [(top-level package, modules, self_us)] with self time summed at every depth.
+    """
+    env = dict(os.environ, WARMUP="off")  # measure the import alone, not the warm-up thread
+    t0 = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - t0
+    if proc.returncode != 0:
+        tail = "\n".join(proc.stderr.strip().splitlines()[-5:])
+        raise SystemExit(f"import {module} failed:\n{tail}")
+
+    rows = _parse(proc.stderr)
+    # A parent is printed after its children, so the target's direct children are the
+    # depth-1 lines between the previous top-level line and the target's own line.
+    children: List[Tuple[str, int, int]] = []
+    pending: List[Tuple[str, int, int]] = []
+    packages: Dict[str, List[int]] = {}
+    for depth, name, self_us, cum_us in rows:
+        if depth == 0:
+            if name == module:
+                children = pending
+            pending = []
+        elif depth == 1:
+            pending.append((name, self_us, cum_us))
+        entry = packages.setdefault(name.split(".")[0], [0, 0])
+        entry[0] += 1
+        entry[1] += self_us
+    children.sort(key=lambda r: r[2], reverse=True)
+    by_package = sorted(((k, v[0], v[1]) for k, v in packages.items()), key=lambda r: r[2], reverse=True)
+    return wall, children, by_package
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("module", nargs="?", default="asgi")
+    parser.add_argument("-n", "--top", type=int, default=15)
+    args = parser.parse_args()
+
+    wall, children, packages = profile_import(args.module)
+    print(f"import {args.module}: {wall * 1000:.0f} ms wall (interpreter start included)")
+    print(f"\nimported directly by {args.module}:")
+    print(f"{'module':<36}{'cumulative ms':>14}{'self ms':>10}")
+    for name, self_us, cum_us in children[: args.top]:
+        print(f"{name:<36}{cum_us / 1000:>14.1f}{self_us / 1000:>10.1f}")
+    print("\nself time by top-level package (all depths):")
+    print(f"{'package':<36}{'modules':>8}{'self ms':>10}")
+    for name, count, self_us in packages[: args.top]:
+        print(f"{name:<36}{count:>8}{self_us / 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
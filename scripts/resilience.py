@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Any, Callable, Dict, Iterator, Optional, TypeVar
+import os
+import threading
+import time
+
+
+T = TypeVar("T")
+
+# Whole-request budget shared by every external call made while serving one request.
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", 25))
+# Below this much budget a call is not worth starting.
+MIN_CALL_SECONDS = 0.25
+
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", 3))
+BREAKER_RECOVERY_SECONDS = float(os.getenv("BREAKER_RECOVERY_SECONDS", 30))
+
+
+class DeadlineExceeded(Exception):
+    """The current request has no time left for another external call."""
+
+
+class CircuitOpenError(Exception):
+    """The dependency's breaker is open; the call was not attempted."""
+
+
+# ---------- Deadlines ----------
+# Absolute time.monotonic() deadline for the current request. Context variables follow
+# asyncio tasks and asyncio.to_thread, so the ASGI app's I/O fan-out sees the same budget.
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+def set_deadline(seconds: float = REQUEST_DEADLINE_SECONDS) -> Token:
+    return _deadline.set(time.monotonic() + seconds)
+
+
+def clear_deadline(token: Token) -> None:
+    _deadline.reset(token)
+
+
+@contextmanager
+def deadline_scope(seconds: float = REQUEST_DEADLINE_SECONDS) -> Iterator[None]:
+    token = set_deadline(seconds)
+    try:
+        yield
+    finally:
+        clear_deadline(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left in the current request's budget, or None outside a request."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def budget(cap: float) -> float:
+    """Timeout for the next call: the dependency's own cap, clipped to what the request has left."""
+    left = remaining()
+    if left is None:
+        return cap
+    if left < MIN_CALL_SECONDS:
+        raise DeadlineExceeded(f"{left:.2f}s left in request budget")
+    return min(cap, left)
+
+
+# ---------- Circuit breakers ----------
+class CircuitBreaker:
+    """
+    Closed: calls pass; consecutive failures are counted.
+    Open: calls fail fast until recovery_seconds have passed.
+    Half-open: a single probe call is let through; success closes, failure re-opens.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        recovery_seconds: float = BREAKER_RECOVERY_SECONDS,
+    ) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self._lock = threading.Lock()
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == "open" and time.monotonic() - self._opened_at >= self.recovery_seconds:
+                return "half_open"
+            return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == "closed":
+                return True
+            if self._state == "open":
+                if time.monotonic() - self._opened_at < self.recovery_seconds:
+                    return False
+                self._state = "half_open"
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = "closed"
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == "half_open" or self._failures >= self.failure_threshold:
+                if self._state != "open":
+                    print(f"[resilience] Circuit for {self.name} opened after {self._failures} failure(s)")
+                self._state = "open"
+                self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def release(self) -> None:
+        """Give back a half-open probe slot without counting a result (e.g. deadline skip)."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        state = self.state
+        with self._lock:
+            return {"state": state, "consecutive_failures": self._failures}
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name)
+        return breaker
+
+
+def breaker_states() -> Dict[str, Dict[str, Any]]:
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {b.name: b.snapshot() for b in breakers}
+
+
+def guarded_call(
+    dependency: str,
+    func: Callable[[float], T],
+    timeout: float,
+    fallback: T,
+    use_deadline: bool = True,
+) -> T:
+    """
+    Call func(timeout) for an external dependency. Returns fallback immediately when the
+    dependency's breaker is open or the request budget is spent. Also returns fallback when
+    func raises; the exception counts as a breaker failure.
+
+    use_deadline=False exempts the call from the request budget, for writes that must not
+    be lost. It then gets its own full timeout and is still guarded by the breaker.
+    """
+    breaker = get_breaker(dependency)
+    if not breaker.allow():
+        print(f"[resilience] {dependency} circuit open; using fallback")
+        return fallback
+    try:
+        call_timeout = budget(timeout) if use_deadline else timeout
+    except DeadlineExceeded as e:
+        breaker.release()
+        print(f"[resilience] Skipping {dependency}: {e}")
+        return fallback
+    try:
+        result = func(call_timeout)
+    except Exception as e:
+        breaker.record_failure()
+        print(f"[resilience] {dependency} call failed: {e}")
+        return fallback
+    breaker.record_success()
+    return result
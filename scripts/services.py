@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from scripts.chat import class_info_dict
+from scripts.database import db
+from scripts.image_store import image_store
+from scripts.inference import get_disease_info, inference
+from scripts.location_service import get_location_from_ip, validate_coordinates
+from scripts.prescreen import ScreenResult
+
+
+# Request handling shared by the Flask dev server (app.py) and the ASGI app (asgi.py).
+# Nothing here touches a framework request object.
+
+
+def save_uploaded_image(image_data: np.ndarray) -> str:
+    """Queue the annotated image in the image store and return its storage key"""
+    return image_store.put(image_data)
+
+
+def resolve_location(lat: Any, lon: Any, user_ip: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Resolve location from submitted coordinates, falling back to the client IP"""
+    location_data = None
+    if lat and lon:
+        is_valid, lat, lon = validate_coordinates(lat, lon)
+        if is_valid:
+            location_data = {'latitude': lat, 'longitude': lon, 'source': 'coordinates'}
+
+    if not location_data:
+        if user_ip and user_ip not in ['127.0.0.1', 'localhost']:
+            ip_location = get_location_from_ip(user_ip)
+            if ip_location:
+                location_data = {
+                    'latitude': ip_location['latitude'],
+                    'longitude': ip_location['longitude'],
+                    'location_name': ip_location['location_name'],
+                    'source': 'ip'
+                }
+    return location_data
+
+
+def detect_disease(image: np.ndarray) -> Tuple[np.ndarray, str, List[Dict[str, Any]]]:
+    """Run disease detection on the image"""
+    try:
+        inference_image, classes, detections = inference(image)
+        disease_info = get_disease_info(classes, detections)
+
+        # Distinct classes, most confident first; weak boxes were already dropped in post-processing
+        label = ", ".join([str(info["class_name"]) for info in disease_info])
+        return inference_image, label, disease_info
+    except Exception as e:
+        print(f"Error in disease detection: {e}")
+        return image, "Detection failed", []
+
+
+def get_chat_context(data: Dict[str, Any]) -> Tuple[Any, str]:
+    """
+    Return (detection_id, disease context) for a chat request.
+    Nothing is kept per process: the client sends back the detection_id and the detected
+    class names, so whichever worker gets the request can answer it.
+    """
+    detection_id = data.get('detection_id')
+    names = [str(name) for name in (data.get('diseases') or []) if name]
+    if not names and detection_id:
+        names = db.get_detected_diseases(detection_id)
+    if class_info_dict:
+        names = [name for name in names if name in class_info_dict]  # drops e.g. "Detection failed"
+    if not names:
+        return detection_id, "No disease information available. Please upload an image first."
+
+    info = ", ".join(f"{name}: {class_info_dict.get(name, 'No information available')}" for name in names)
+    return detection_id, info
+
+
+def rejection_response(screen: ScreenResult) -> Dict[str, Any]:
+    """
+    Payload for an upload that failed pre-screening; same shape as a detection, with no
+    label and no image. The client already has the photo it sent, so it is not echoed back.
+    """
+    return {
+        'image': None,
+        'label': '',
+        'message': screen.message,
+        'disease_info': [],
+        'detection_id': None,
+        'location': None,
+        'rejected': True,
+        'reason': screen.reason,
+        'metrics': screen.metrics,
+    }
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from datetime import datetime
+import os
+import threading
+import time
+
+
+# WARMUP=background (default) loads heavy dependencies on a thread after start-up;
+# WARMUP=off leaves everything to first use.
+WARMUP_MODE = os.getenv("WARMUP", "background").lower()
+
+# Components that must be up before the instance should take detection traffic.
+REQUIRED_COMPONENTS = ("opencv", "model")
+
+
+def _warm_opencv() -> None:
+    import cv2  # noqa: F401
+
+
+def _warm_model() -> None:
+    import numpy as np
+
+    from scripts.inference import load_model, predict
+
+    # The model is shared by every serving thread, so this load is the one they all use.
+    # One tiny prediction initialises torch kernels as well as loading weights.
+    predict(load_model(), np.zeros((64, 64, 3), dtype=np.uint8), verbose=False)
+
+
+def _warm_database() -> None:
+    from scripts.database import db
+
+    db.supabase
+
+
+WARMUP_STEPS: List[Tuple[str, Callable[[], None]]] = [
+    ("opencv", _warm_opencv),
+    ("model", _warm_model),
+    ("database", _warm_database),
+]
+
+
+class Readiness:
+    """Tracks warm-up of heavy components; liveness never depends on this."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.started_at = time.monotonic()
+        # With WARMUP=off components load on first request, so they don't hold up readiness.
+        initial = "deferred" if WARMUP_MODE == "off" else "pending"
+        self.components: Dict[str, Dict[str, Any]] = {
+            name: {"status": initial} for name, _ in WARMUP_STEPS
+        }
+
+    def _run(self) -> None:
+        for name, step in WARMUP_STEPS:
+            t0 = time.perf_counter()
+            try:
+                step()
+                result = {"status": "ok"}
+            except Exception as e:
+                print(f"[warmup] {name} failed: {e}")
+                result = {"status": "error", "error": str(e)}
+            result["seconds"] = round(time.perf_counter() - t0, 3)
+            with self._lock:
+                self.components[name] = result
+
+    def start(self) -> None:
+        """Start the background warm-up once; a no-op when WARMUP=off or already started."""
+        if WARMUP_MODE == "off":
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+            self._thread.start()
+
+    @staticmethod
+    def _is_ready(components: Dict[str, Dict[str, Any]]) -> bool:
+        return all(components[name]["status"] in ("ok", "deferred") for name in REQUIRED_COMPONENTS)
+
+    @property
+    def ready(self) -> bool:
+        with self._lock:
+            return self._is_ready(self.components)
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            components = {name: dict(info) for name, info in self.components.items()}
+        ready = self._is_ready(components)
+        return {
+            "ready": ready,
+            "uptime_seconds": round(time.monotonic() - self.started_at, 3),
+            "components": components,
+            "timestamp": datetime.now().isoformat(),
+        }
+
+
+# Singleton used by other modules
+readiness = Readiness()
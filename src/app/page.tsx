@@ -153,10 +153,15 @@ export default function Home() {
         setDetectedDiseases(result.disease_info || [])
         setLocationData(result.location)
         setDetectionId(result.detection_id)
-        setSelectedImage(`data:image/jpeg;base64,${result.image}`)
+        // Rejected uploads come back without an image; keep the local preview
+        if (result.image) {
+          setSelectedImage(`data:image/jpeg;base64,${result.image}`)
+        }
         
         // Speak results if speech is enabled
-        if (result.label) {
+        if (result.rejected) {
+          speakText(result.message)
+        } else if (result.label) {
           speakText(`I detected ${result.label} in your plant image.`)
         }
       } else {
@@ -417,6 +422,7 @@ export default function Home() {
           <TabsContent value="chat">
             <ChatInterface 
               detectionId={detectionId}
+              detectedDiseases={detectedDiseases}
               onSpeak={speakText}
               isSpeaking={isSpeaking}
             />
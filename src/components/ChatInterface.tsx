@@ -28,11 +28,12 @@ interface Message {
 
 interface ChatInterfaceProps {
   detectionId: string | null
+  detectedDiseases?: { class_name: string }[]
   onSpeak: (text: string) => void
   isSpeaking: boolean
 }
 
-export default function ChatInterface({ detectionId, onSpeak, isSpeaking }: ChatInterfaceProps) {
+export default function ChatInterface({ detectionId, detectedDiseases = [], onSpeak, isSpeaking }: ChatInterfaceProps) {
   const [messages, setMessages] = useState<Message[]>([
     {
       id: '1',
@@ -117,6 +118,9 @@ export default function ChatInterface({ detectionId, onSpeak, isSpeaking }: Chat
         },
         body: JSON.stringify({
           message: inputMessage,
+          // The API keeps no per-user state, so send back what this chat is about
+          detection_id: detectionId,
+          diseases: detectedDiseases.map(disease => disease.class_name),
           chatHistory: messages.map(msg => ({
             user: msg.type === 'user' ? msg.content : '',
             bot: msg.type === 'bot' ? msg.content : ''
@@ -10,15 +10,24 @@ if [ ! -d ".next" ]; then
     npm run build
 fi
 
-echo "Starting Flask API on port 5000..."
-python app.py &
-FLASK_PID=$!
+echo "Starting API (ASGI, gunicorn + uvicorn workers) on port 5000..."
+mkdir -p uploads
+# Exported so each worker can size its torch thread pool to its share of the cores
+export WEB_CONCURRENCY="${WEB_CONCURRENCY:-2}"
+gunicorn asgi:app \
+    --worker-class uvicorn_worker.UvicornWorker \
+    --workers "$WEB_CONCURRENCY" \
+    --bind 0.0.0.0:5000 \
+    --timeout 120 \
+    --graceful-timeout 30 \
+    --keep-alive 5 &
+API_PID=$!
 
 echo "Starting Next.js server on port $PORT..."
 # Use node loader instead of tsx command
 HOST=0.0.0.0 PORT=$PORT NODE_ENV=production node --loader tsx server.ts
 
 # Cleanup when Next.js exits
-echo "Next.js server stopped, shutting down Flask..."
-kill $FLASK_PID 2>/dev/null || true
+echo "Next.js server stopped, shutting down API..."
+kill $API_PID 2>/dev/null || true
 exit 0